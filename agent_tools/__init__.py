@@ -9,6 +9,7 @@ Agent Tools 包
 - parser: LLM响应解析器
 - tool_manager: 工具调用管理系统
 - tools: 基础工具实现
+- session_manager: HTTP会话管理器
 - task_analyzer: 任务完成状态分析器
 - gemini_analyzer: 基于Gemini的任务分析器
 - followup_generator: 自动跟进问题生成器
@@ -18,6 +19,7 @@ from .llm_service import LLMService
 from .parser import ParsedResponse, BaseResponseParser, ApiCallResponseParser, DefaultResponseParser
 from .tool_manager import ToolManager
 from .tools import BaseTool, ToolCallResult
+from .session_manager import SessionManager, get_default_session_manager
 from .task_analyzer import BaseTaskAnalyzer, RuleBasedAnalyzer, LLMTaskAnalyzer, get_default_analyzer
 from .followup_generator import FollowupGenerator, LLMFollowupGenerator, get_default_generator
 
@@ -5,8 +5,94 @@
 用于维持与Claude的交互直到任务完成。
 """
 
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+from types import SimpleNamespace
 from typing import List, Tuple, Dict, Any, Optional
 
+
+@dataclass(slots=True)
+class _Request:
+    """传给LLMService.process_chat_request的轻量请求对象"""
+    messages: list
+
+# 条件导入pyahocorasick，缺失时回退到逐词substring扫描
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 生成器提示模板提升到模块级，避免每次调用重建多KB的f-string
+_GENERATOR_TEMPLATE = """
+        作为对话助手，请为下列AI回复生成一个简短的跟进问题，以便继续完成用户的任务。
+
+        原始请求:
+        {original_request}
+
+        最近的对话:
+        {history_str}
+
+        最新AI回复:
+        {last_response}
+
+        当前状态: {task_status}
+        说明: {status_description}
+
+        请根据当前状态生成一个自然、有帮助的跟进问题，限制在30字以内。这个问题将自动发送给AI以继续任务。
+        如果是NEEDS_MORE_INFO状态，请询问用户提供更多信息。
+        如果是CONTINUE状态，请要求AI继续完成未完成的任务。
+        不要解释为什么生成这个问题，直接给出问题文本。
+        """
+
+_STATUS_DESCRIPTIONS = {
+    "NEEDS_MORE_INFO": "AI需要用户提供更多信息来完成任务。",
+    "CONTINUE": "AI已经开始回答，但任务尚未完成，需要继续。"
+}
+
+# 上下文类型关键词表，按优先级排列（靠前的类型优先）
+_CONTEXT_KEYWORDS = (
+    ("code", ("```", "代码", "function", "class")),
+    ("explanation", ("解释", "说明", "首先")),
+    ("comparison", ("比较", "优点", "缺点", "区别")),
+    ("example", ("例如", "示例", "案例")),
+    ("implementation", ("实现", "步骤", "流程")),
+)
+
+# 上下文自动机在模块导入时构建一次：一次线性扫描覆盖全部关键词
+if ahocorasick is not None:
+    _CONTEXT_AC = ahocorasick.Automaton()
+    for _priority, (_context_type, _keywords) in enumerate(_CONTEXT_KEYWORDS):
+        for _keyword in _keywords:
+            _CONTEXT_AC.add_word(_keyword, (_priority, _context_type))
+    _CONTEXT_AC.make_automaton()
+else:
+    _CONTEXT_AC = None
+
+
+@lru_cache(maxsize=4096)
+def _detect_context_type_cached(response: str) -> Optional[str]:
+    """检测回复中的上下文类型（纯函数，结果按回复内容记忆化）"""
+    # 优先走Aho-Corasick：对整个回复只扫一遍，
+    # 按关键词表的优先级取最靠前的类型
+    if _CONTEXT_AC is not None:
+        best = None
+        for _, (priority, context_type) in _CONTEXT_AC.iter(response):
+            if priority == 0:
+                return context_type
+            if best is None or priority < best[0]:
+                best = (priority, context_type)
+        return best[1] if best else None
+
+    # 回退路径：逐类型substring扫描
+    for context_type, keywords in _CONTEXT_KEYWORDS:
+        if any(keyword in response for keyword in keywords):
+            return context_type
+
+    # 无法确定具体类型
+    return None
+
+
 class FollowupGenerator:
     """跟进问题生成器
     
@@ -28,7 +114,7 @@ class FollowupGenerator:
             "example": "请继续提供具体的使用示例。",
             "implementation": "请继续说明实现细节和步骤。"
         }
-        
+
     def generate_followup(self, 
                           task_status: str, 
                           conversation_history: List[Tuple[str, str]],
@@ -58,30 +144,12 @@ class FollowupGenerator:
         return self.default_followups.get(task_status)
     
     def _detect_context_type(self, response: str) -> Optional[str]:
-        """检测回复中的上下文类型"""
-        
-        # 代码相关
-        if "```" in response or "代码" in response or "function" in response or "class" in response:
-            return "code"
-            
-        # 解释说明相关
-        if "解释" in response or "说明" in response or "首先" in response:
-            return "explanation"
-            
-        # 比较相关
-        if "比较" in response or "优点" in response or "缺点" in response or "区别" in response:
-            return "comparison"
-            
-        # 示例相关
-        if "例如" in response or "示例" in response or "案例" in response:
-            return "example"
-            
-        # 实现相关
-        if "实现" in response or "步骤" in response or "流程" in response:
-            return "implementation"
-            
-        # 无法确定具体类型
-        return None
+        """检测回复中的上下文类型
+
+        分类不依赖实例状态，同一回复在同一会话的多个跟进轮次里
+        反复出现，委托模块级记忆化版本把重复扫描变成哈希查找。
+        """
+        return _detect_context_type_cached(response)
         
         
 class LLMFollowupGenerator(FollowupGenerator):
@@ -96,7 +164,38 @@ class LLMFollowupGenerator(FollowupGenerator):
     def __init__(self, llm_service):
         super().__init__()
         self.llm_service = llm_service
-        
+
+    async def generate_followups(self, triples, max_concurrency=None):
+        """并发为一批独立对话生成跟进问题
+
+        N个对话的LLM调用用asyncio.gather同时发出，总耗时从
+        N次round-trip降为约一个round-trip窗口。规则版
+        FollowupGenerator.generate_followup本身是同步且极快的，
+        不需要这种批量接口。
+
+        :param triples: (task_status, conversation_history, last_response)列表
+        :param max_concurrency: 可选的最大并发数（限流用）
+        :return: 与triples顺序对应的跟进问题列表（不需要跟进的为None）
+        """
+        if max_concurrency is None:
+            return list(await asyncio.gather(
+                *(self.generate_followup(status, history, last_response)
+                  for status, history, last_response in triples)))
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(status, history, last_response):
+            async with semaphore:
+                return await self.generate_followup(status, history, last_response)
+
+        return list(await asyncio.gather(
+            *(_one(status, history, last_response)
+              for status, history, last_response in triples)))
+
+    async def batch_generate_followup(self, items):
+        """generate_followups的兼容别名"""
+        return await self.generate_followups(items)
+
     async def generate_followup(self, 
                                task_status: str, 
                                conversation_history: List[Tuple[str, str]],
@@ -110,11 +209,10 @@ class LLMFollowupGenerator(FollowupGenerator):
         # 使用LLM生成跟进问题
         prompt = self._build_generator_prompt(
             task_status, conversation_history, last_response)
-            
-        # 构建请求对象
-        request = type('Request', (), {})()
-        request.messages = [type('Message', (), {'content': prompt})]
-        
+
+        # 构建请求对象（复用模块级dataclass，不再每次动态造类）
+        request = _Request(messages=[SimpleNamespace(content=prompt)])
+
         # 调用LLM
         result = await self.llm_service.process_chat_request(request)
         
@@ -129,37 +227,20 @@ class LLMFollowupGenerator(FollowupGenerator):
         # 获取原始请求
         original_request = conversation_history[0][0] if conversation_history else "无"
         
-        # 构建简洁的对话历史
-        history_str = "\n".join([
-            f"用户: {q}\nAI: {a[:100]}..." 
-            for q, a in conversation_history[-2:] if len(conversation_history) >= 2
-        ])
-        
-        status_descriptions = {
-            "NEEDS_MORE_INFO": "AI需要用户提供更多信息来完成任务。",
-            "CONTINUE": "AI已经开始回答，但任务尚未完成，需要继续。"
-        }
-        
-        return f"""
-        作为对话助手，请为下列AI回复生成一个简短的跟进问题，以便继续完成用户的任务。
-        
-        原始请求:
-        {original_request}
-        
-        最近的对话:
-        {history_str}
-        
-        最新AI回复:
-        {last_response}
-        
-        当前状态: {task_status}
-        说明: {status_descriptions.get(task_status, "")}
-        
-        请根据当前状态生成一个自然、有帮助的跟进问题，限制在30字以内。这个问题将自动发送给AI以继续任务。
-        如果是NEEDS_MORE_INFO状态，请询问用户提供更多信息。
-        如果是CONTINUE状态，请要求AI继续完成未完成的任务。
-        不要解释为什么生成这个问题，直接给出问题文本。
-        """
+        # 构建简洁的对话历史（长度判断提到循环外，生成器直接喂join）
+        if len(conversation_history) < 2:
+            history_str = ""
+        else:
+            history_str = "\n".join(
+                f"用户: {q}\nAI: {a[:100]}..."
+                for q, a in conversation_history[-2:])
+        
+        return _GENERATOR_TEMPLATE.format(
+            original_request=original_request,
+            history_str=history_str,
+            last_response=last_response,
+            task_status=task_status,
+            status_description=_STATUS_DESCRIPTIONS.get(task_status, ""))
 
 
 def get_default_generator() -> FollowupGenerator:
@@ -8,10 +8,100 @@ Gemini任务分析器
 import os
 import json
 import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType
 import google.generativeai as genai
 from typing import List, Tuple, Dict, Any, Optional
 
-from .task_analyzer import BaseTaskAnalyzer
+from .task_analyzer import (BaseTaskAnalyzer, _run_sync,
+                            COMPLETED, NEEDS_MORE_INFO, CONTINUE)
+
+# 条件导入pyahocorasick，缺失时回退到逐类型substring扫描
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 任务类型关键词表，按优先级排列（靠前的类型优先），关键词统一小写
+_TASK_TYPE_KEYWORDS = (
+    ("code", ("代码", "编程", "程序", "函数", "脚本", "code", "programming")),
+    ("explanation", ("解释", "说明", "介绍", "描述", "explain", "describe", "introduction")),
+    ("factual", ("什么是", "定义", "列出", "when", "where", "what", "who", "list")),
+    ("creative", ("创意", "创作", "故事", "写一个", "想象", "creative", "story", "imagine")),
+)
+
+# 任务类型自动机在模块导入时构建一次：一次线性扫描覆盖全部关键词
+if ahocorasick is not None:
+    _TASK_TYPE_AC = ahocorasick.Automaton()
+    for _priority, (_task_type, _keywords) in enumerate(_TASK_TYPE_KEYWORDS):
+        for _keyword in _keywords:
+            if not _TASK_TYPE_AC.exists(_keyword):
+                _TASK_TYPE_AC.add_word(_keyword, (_priority, _task_type))
+    _TASK_TYPE_AC.make_automaton()
+else:
+    _TASK_TYPE_AC = None
+
+
+@lru_cache(maxsize=4096)
+def _detect_task_type_cached(request: str) -> str:
+    """检测任务类型（纯函数，结果按请求内容记忆化）
+
+    同一original_request在一个对话的每个跟进轮次都会再分类一次，
+    记忆化后从第二轮起只剩一次哈希查找。
+    """
+    # casefold一次，供所有关键词匹配复用
+    request_lower = request.casefold()
+
+    # 优先走Aho-Corasick：对请求只扫一遍，按优先级取最靠前的类型
+    if _TASK_TYPE_AC is not None:
+        best = None
+        for _, (priority, task_type) in _TASK_TYPE_AC.iter(request_lower):
+            if priority == 0:
+                return task_type
+            if best is None or priority < best[0]:
+                best = (priority, task_type)
+        if best is not None:
+            return best[1]
+        # 默认为解释性任务
+        return "explanation"
+
+    # 回退路径：逐类型substring扫描
+    for task_type, keywords in _TASK_TYPE_KEYWORDS:
+        if any(keyword in request_lower for keyword in keywords):
+            return task_type
+
+    # 默认为解释性任务
+    return "explanation"
+
+# 分析提示模板提升到模块级，避免每次调用重建多KB的f-string
+_ANALYZER_TEMPLATE = """
+        分析下面AI回复是否完成了用户的请求。
+
+        原始请求: {original_request}
+
+        任务类型: {task_type}
+
+        对话历史摘要:
+        {history_summary}
+
+        最新AI回复:
+        {last_response}...
+
+        根据以下标准分析AI回复:
+        1. 回复是否直接且完整地回答了用户的请求
+        2. 回复是否包含所有必要的细节和信息
+        3. 回复是否存在需要继续解释或展开的内容
+        4. 回复是否提出了需要用户提供更多信息的问题
+
+        只返回以下三种状态之一（不要解释你的选择）:
+        COMPLETED - 任务已经完成，无需进一步交互
+        NEEDS_MORE_INFO - 需要用户提供更多信息才能继续
+        CONTINUE - 任务进行中但尚未完成，AI应该继续
+        """
 
 class GeminiTaskAnalyzer(BaseTaskAnalyzer):
     """基于Google Gemini模型的任务分析器
@@ -21,9 +111,14 @@ class GeminiTaskAnalyzer(BaseTaskAnalyzer):
     Args:
         api_key (str, optional): Gemini API密钥
         model_name (str, optional): Gemini模型名称，默认为'gemini-2.0-flash'
+        result_cache_ttl (float, optional): 分析结果缓存的有效期（秒），
+            0表示关闭缓存
     """
-    
-    def __init__(self, api_key=None, model_name='gemini-2.0-flash'):
+
+    _RESULT_CACHE_SIZE = 1024
+
+    def __init__(self, api_key=None, model_name='gemini-2.0-flash',
+                 result_cache_ttl=60):
         """初始化Gemini任务分析器"""
         # 获取API密钥（优先使用参数传入的值，其次使用环境变量）
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
@@ -36,15 +131,27 @@ class GeminiTaskAnalyzer(BaseTaskAnalyzer):
             genai.configure(api_key=self.api_key)
             
         self.model_name = model_name
-        
-        # 设置模型参数
-        self.generation_config = {
+
+        # 设置模型参数（只读视图，避免被意外修改）
+        self.generation_config = MappingProxyType({
             "temperature": 0,  # 无创造性，确保一致性
             "top_p": 0.95,
             "top_k": 0,
             "max_output_tokens": 100,  # 限制输出长度，我们只需要简短判断
-        }
-        
+        })
+
+        # 模型实例构建一次并复用，避免每次分析都重建客户端包装
+        if not self.use_mock:
+            self._model = genai.GenerativeModel(model_name=self.model_name,
+                                                generation_config=dict(self.generation_config))
+        else:
+            self._model = None
+
+        # 分析提示 -> 状态结论的TTL缓存：agent监督器常在琐碎的工具调用后
+        # 对同一对话状态重复求值，短TTL内直接返回上次结论，省一次HTTP往返
+        self._result_cache_ttl = result_cache_ttl
+        self._result_cache: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+
         # 为不同类型的请求设置不同的权重
         self.task_weights = {
             "code": 1.2,       # 代码请求通常需要更多交互
@@ -53,138 +160,135 @@ class GeminiTaskAnalyzer(BaseTaskAnalyzer):
             "creative": 1.5,   # 创意性请求通常需要更多交互
         }
     
-    def analyze(self, 
-                conversation_history: List[Tuple[str, str]], 
+    def analyze(self,
+                conversation_history: List[Tuple[str, str]],
                 last_response: str) -> str:
-        """同步分析任务是否完成（使用asyncio运行异步方法）"""
+        """同步兼容入口（异步调用方请使用aanalyze）"""
         # 如果没有API密钥，使用伪判断逻辑
         if self.use_mock:
             return self._mock_analyze(conversation_history, last_response)
-            
-        # 使用asyncio创建一个事件循环来运行异步方法
-        loop = asyncio.new_event_loop()
-        try:
-            result = loop.run_until_complete(
-                self._async_analyze(conversation_history, last_response)
-            )
-            return result
-        finally:
-            loop.close()
-    
+
+        # 无循环时直接asyncio.run；循环内被同步调用时转发到共享后台循环
+        return _run_sync(self._async_analyze(conversation_history, last_response))
+
+    async def aanalyze(self,
+                       conversation_history: List[Tuple[str, str]],
+                       last_response: str) -> str:
+        """异步分析任务是否完成（推荐接口）"""
+        if self.use_mock:
+            return self._mock_analyze(conversation_history, last_response)
+
+        return await self._async_analyze(conversation_history, last_response)
+
+
     async def _async_analyze(self, 
                            conversation_history: List[Tuple[str, str]], 
                            last_response: str) -> str:
         """使用Gemini模型分析任务是否完成"""
+        # 入口处只做一次截断，后续helper直接用切好的片段
+        short = last_response[:500]
+
         # 构建分析提示
-        prompt = self._build_analyzer_prompt(conversation_history, last_response)
-        
+        prompt = self._build_analyzer_prompt(conversation_history, short)
+
+        # 提示对(原始请求, 历史摘要, 最新回复)是确定性的，先查TTL缓存
+        key = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+        if self._result_cache_ttl > 0:
+            entry = self._result_cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self._result_cache_ttl:
+                self._result_cache.move_to_end(key)
+                return entry[1]
+
         try:
-            # 获取模型
-            model = genai.GenerativeModel(model_name=self.model_name,
-                                         generation_config=self.generation_config)
-            
-            # 发送请求到Gemini
-            response = await asyncio.to_thread(
-                model.generate_content, prompt
-            )
-            
-            # 解析返回结果
-            result = response.text.strip()
-            
-            # 解析结果
-            return self._parse_response(result)
-            
+            # 发送请求到Gemini（SDK原生异步接口，不再为每次调用开线程，
+            # 批量gather时多个分析器共享同一个连接器）。
+            # 流式读取：状态词通常就是第一个token，命中即终止流，
+            # 省掉剩余输出的等待和计费
+            response = await self._model.generate_content_async(prompt, stream=True)
+
+            accumulated = ""
+            status = None
+            async for chunk in response:
+                accumulated += chunk.text
+                for state in (COMPLETED, NEEDS_MORE_INFO, CONTINUE):
+                    if state in accumulated:
+                        status = state
+                        break
+                if status is not None:
+                    # 提前终止：吃掉流的剩余部分，保证连接正确归还
+                    await response.resolve()
+                    break
+
+            if status is None:
+                # 流读完也没有精确命中状态词，走完整解析兜底
+                status = self._parse_response(accumulated.strip())
+
+            # 解析成功后写入缓存并按LRU淘汰
+            if self._result_cache_ttl > 0:
+                self._result_cache[key] = (time.monotonic(), status)
+                self._result_cache.move_to_end(key)
+                while len(self._result_cache) > self._RESULT_CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
+
+            return status
+
         except Exception as e:
             print(f"Gemini API调用出错: {str(e)}")
             # 出错时使用保守策略，认为任务未完成
-            return "CONTINUE"
+            return CONTINUE
     
-    def _build_analyzer_prompt(self, 
-                              conversation_history: List[Tuple[str, str]], 
-                              last_response: str) -> str:
-        """构建分析提示"""
+    def _build_analyzer_prompt(self,
+                              conversation_history: List[Tuple[str, str]],
+                              last_response_short: str) -> str:
+        """构建分析提示
+
+        Args:
+            last_response_short: 调用方已截断到500字符的最新回复
+        """
         # 获取原始请求
         original_request = conversation_history[0][0] if conversation_history else "无"
         
-        # 构建对话历史摘要
-        history_summary = "\n".join([
-            f"用户: {q}\nAI: {a[:100]}..." 
-            for q, a in conversation_history[:-1]
-        ]) if len(conversation_history) > 1 else "无之前对话"
-        
+        # 构建对话历史摘要（islice避免对长历史做切片拷贝）
+        if len(conversation_history) > 1:
+            history_summary = "\n".join(
+                f"用户: {q}\nAI: {a[:100]}..."
+                for q, a in islice(conversation_history,
+                                   len(conversation_history) - 1))
+        else:
+            history_summary = "无之前对话"
+
         # 检测任务类型
         task_type = self._detect_task_type(original_request)
-        
-        # 创建提示
-        prompt = f"""
-        分析下面AI回复是否完成了用户的请求。
 
-        原始请求: {original_request}
-        
-        任务类型: {task_type}
-        
-        对话历史摘要:
-        {history_summary}
-        
-        最新AI回复:
-        {last_response[:500]}...
-        
-        根据以下标准分析AI回复:
-        1. 回复是否直接且完整地回答了用户的请求
-        2. 回复是否包含所有必要的细节和信息
-        3. 回复是否存在需要继续解释或展开的内容
-        4. 回复是否提出了需要用户提供更多信息的问题
-        
-        只返回以下三种状态之一（不要解释你的选择）:
-        COMPLETED - 任务已经完成，无需进一步交互
-        NEEDS_MORE_INFO - 需要用户提供更多信息才能继续
-        CONTINUE - 任务进行中但尚未完成，AI应该继续
-        """
-        
-        return prompt
+        return _ANALYZER_TEMPLATE.format(
+            original_request=original_request,
+            task_type=task_type,
+            history_summary=history_summary,
+            last_response=last_response_short)
         
     def _parse_response(self, response: str) -> str:
         """解析Gemini的响应"""
-        # 尝试直接匹配状态关键词
+        # 尝试直接匹配状态关键词（返回intern后的常量）
         if "COMPLETED" in response:
-            return "COMPLETED"
+            return COMPLETED
         elif "NEEDS_MORE_INFO" in response:
-            return "NEEDS_MORE_INFO"
+            return NEEDS_MORE_INFO
         elif "CONTINUE" in response:
-            return "CONTINUE"
+            return CONTINUE
             
         # 如果没有明确匹配，分析响应文本
         response_lower = response.lower()
         if "完成" in response_lower or "完整" in response_lower or "足够" in response_lower:
-            return "COMPLETED"
+            return COMPLETED
         elif "更多信息" in response_lower or "提供" in response_lower or "问题" in response_lower:
-            return "NEEDS_MORE_INFO"
+            return NEEDS_MORE_INFO
         else:
             # 默认继续
-            return "CONTINUE"
+            return CONTINUE
             
     def _detect_task_type(self, request: str) -> str:
-        """检测任务类型"""
-        request_lower = request.lower()
-        
-        # 代码相关任务
-        if any(kw in request_lower for kw in ["代码", "编程", "程序", "函数", "脚本", "code", "programming"]):
-            return "code"
-            
-        # 解释性任务
-        if any(kw in request_lower for kw in ["解释", "说明", "介绍", "描述", "explain", "describe", "introduction"]):
-            return "explanation"
-            
-        # 事实性任务
-        if any(kw in request_lower for kw in ["什么是", "定义", "列出", "when", "where", "what", "who", "list"]):
-            return "factual"
-            
-        # 创意性任务
-        if any(kw in request_lower for kw in ["创意", "创作", "故事", "写一个", "想象", "creative", "story", "imagine"]):
-            return "creative"
-            
-        # 默认为解释性任务
-        return "explanation"
+        """检测任务类型（委托模块级记忆化版本）"""
+        return _detect_task_type_cached(request)
         
     def _mock_analyze(self, 
                      conversation_history: List[Tuple[str, str]], 
@@ -195,9 +299,10 @@ class GeminiTaskAnalyzer(BaseTaskAnalyzer):
         # 1. 检查最新回复的长度
         if len(last_response) < 100:
             # 短回复可能是在询问更多信息
-            return "NEEDS_MORE_INFO"
+            return NEEDS_MORE_INFO
             
-        # 2. 检查是否包含常见的完成指示词
+        # 2. 检查是否包含常见的完成指示词（结束语都在结尾，只切一次尾部窗口）
+        tail = last_response[-400:] if len(last_response) > 400 else last_response
         completion_indicators = [
             "希望这对你有帮助",
             "希望这解答了你的问题",
@@ -206,16 +311,16 @@ class GeminiTaskAnalyzer(BaseTaskAnalyzer):
             "总结一下",
             "总而言之"
         ]
-        
+
         for indicator in completion_indicators:
-            if indicator in last_response:
-                return "COMPLETED"
+            if indicator in tail:
+                return COMPLETED
                 
         # 3. 检查是否列表回复（通常是完整回答）
         list_pattern_count = last_response.count("- ")
         if list_pattern_count > 3:
             # 包含多个列表项的回复通常是完整的
-            return "COMPLETED"
+            return COMPLETED
             
         # 4. 检查请求类型
         request = conversation_history[0][0] if conversation_history else ""
@@ -223,11 +328,11 @@ class GeminiTaskAnalyzer(BaseTaskAnalyzer):
         
         # 5. 根据任务类型和回复长度评估完成状态
         if task_type == "factual" and len(last_response) > 300:
-            return "COMPLETED"
+            return COMPLETED
         elif task_type == "explanation" and len(last_response) > 500:
-            return "COMPLETED"
+            return COMPLETED
         elif task_type == "code" and "```" in last_response and len(last_response) > 600:
-            return "COMPLETED"
+            return COMPLETED
             
         # 默认继续
-        return "CONTINUE"
\ No newline at end of file
+        return CONTINUE
\ No newline at end of file
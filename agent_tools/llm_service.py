@@ -6,45 +6,208 @@ LLM 服务统一接口层
 3. 返回原始响应供后续处理
 
 依赖注入要求：
-- call_llm: LLM调用器实现，需实现 async def (prompt, system_prompt, messages, stream) 接口
+- call_llm: LLM调用器实现，需实现 async def (prompt, system_prompt, messages, stream) 接口。
+  约定：系统提示只经system_prompt参数传递一次，messages里只含对话消息，
+  不再重复一条system消息——重复注入会让模型吃两遍系统提示的token，
+  还会破坏提供商前缀缓存的字节级稳定性
 - roles: 角色配置字典，需包含各角色的系统提示配置
+- embedder: 可选的嵌入函数（文本 -> 向量），注入后启用语义缓存层
 """
+import asyncio
+import json
+import hashlib
+import math
+from collections import OrderedDict
+
+
 class LLMService:
-    def __init__(self, call_llm, roles):  # 核心依赖注入点
+    def __init__(self, call_llm, roles,
+                 cache_size=256, embedder=None, semantic_threshold=0.9,
+                 conversation_history=None, anthropic_cache=False):  # 核心依赖注入点
         """
         :param call_llm: 必须注入的LLM调用实现
         :param roles: 必须注入的角色配置字典
+        :param cache_size: 精确匹配缓存的容量（0表示关闭缓存）
+        :param embedder: 可选的嵌入函数，注入后对最后一条用户消息启用语义缓存
+        :param semantic_threshold: 语义缓存命中的余弦相似度阈值
+        :param conversation_history: 传入列表（可为空）即启用有状态多轮模式：
+            消息按 [系统提示] -> [已提交的(user, assistant)对] -> [新用户消息]
+            组织，已提交条目永不改写，使提供商的前缀KV缓存可跨轮复用；
+            传None保持原有的无状态单次调用行为
+        :param anthropic_cache: 使用Anthropic适配器时置True，
+            在系统消息上标注cache_control以启用提示缓存
         """
         self.call_llm = call_llm
         self.roles = roles  # 保留角色配置
-        self.current_role = "default"  # 当前角色标识
+
+        # 系统提示构建后冻结，不逐轮重新取值/插值，保证前缀字节级稳定；
+        # 系统消息dict也只构建一次，角色变化时经set_role重建
+        self._anthropic_cache = anthropic_cache
+        self._system = None
+        self._system_message = None
+        self._current_role = None
+        self.set_role("default")  # 当前角色标识
+        self.history = conversation_history  # None表示无状态模式
+
+        # 两级响应缓存：
+        # 1) 精确匹配层：blake2b(规范化JSON消息+系统提示) -> 原始响应，LRU淘汰
+        # 2) 语义层（可选）：最后一条用户消息的嵌入向量，余弦相似度达阈值即命中
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._embedder = embedder
+        self._semantic_threshold = semantic_threshold
+        self._semantic_entries = []  # [(向量, 原始响应)]
+
+    @staticmethod
+    def _cache_key(system_prompt, messages) -> bytes:
+        """对(系统提示, 消息列表)计算稳定的缓存键"""
+        payload = json.dumps([system_prompt, messages],
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+    async def alookup(self, key, last_user_content=None):
+        """查询缓存（可被子类覆盖接入Redis等外部缓存）
+
+        :return: 命中的原始响应，未命中返回None
+        """
+        if key in self._cache:
+            self._cache.move_to_end(key)  # LRU：命中移到队尾
+            return self._cache[key]
+
+        # 语义层：对最后一条用户消息做近似匹配
+        if self._embedder is not None and last_user_content is not None:
+            vector = self._embedder(last_user_content)
+            for cached_vector, cached_response in self._semantic_entries:
+                if self._cosine(vector, cached_vector) >= self._semantic_threshold:
+                    return cached_response
+        return None
+
+    async def aupdate(self, key, response, last_user_content=None):
+        """写入缓存（可被子类覆盖接入Redis等外部缓存）"""
+        if self._cache_size <= 0:
+            return
+        self._cache[key] = response
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        if self._embedder is not None and last_user_content is not None:
+            self._semantic_entries.append(
+                (self._embedder(last_user_content), response))
+            if len(self._semantic_entries) > self._cache_size:
+                self._semantic_entries.pop(0)
+
+    @staticmethod
+    def _cosine(a, b) -> float:
+        """计算两个向量的余弦相似度"""
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+
+    @property
+    def current_role(self):
+        """当前角色标识（赋值等价于调用set_role）"""
+        return self._current_role
+
+    @current_role.setter
+    def current_role(self, role):
+        # 兼容文档中的llm_service.current_role = "coder"用法：
+        # 直接赋值也要重建冻结的系统提示，否则角色切换被静默忽略
+        self.set_role(role)
+
+    def set_role(self, role):
+        """切换当前角色并重建缓存的系统消息"""
+        self._current_role = role
+        self._system = self.roles[role]["system_prompt"]
+        system_message = {"role": "system", "content": self._system}
+        if self._anthropic_cache:
+            system_message["cache_control"] = {"type": "ephemeral"}
+        self._system_message = system_message
+
+    def commit_assistant_reply(self, reply):
+        """把assistant回复提交进对话历史（仅有状态模式）
+
+        已提交的(user, assistant)对此后保持字节级不变，
+        构成提供商前缀缓存可命中的稳定前缀。
+        """
+        if self.history is not None:
+            self.history.append({"role": "assistant", "content": reply})
 
     async def process_chat_request(self, request):
         # 构建包含系统提示的消息结构
         # 维护对话上下文（当前实现为全量历史）
         # 执行LLM调用并处理响应解析
         # 返回原始响应和结构化响应
-        
-        # 构建消息列表
-        messages = [{
-            "role": "system",
-            "content": self.roles[self.current_role]["system_prompt"]
-        }]
-        for msg in request.messages:
-            messages.append({"role": "user", "content": msg.content})
-        
+
+        # 构建消息列表：[稳定前缀(已提交历史)] + [新用户消息]。
+        # 系统提示只经system_prompt参数传递，不再在messages里重复注入；
+        # 仅Anthropic适配器例外——cache_control标记必须附着在消息上，
+        # 此时适配器应把system_prompt参数当作元数据，不再二次注入
+        if self._anthropic_cache:
+            messages = [self._system_message]
+        else:
+            messages = []
+
+        if self.history is not None:
+            # 有状态模式：新用户消息追加到历史，之前的条目不做任何改写
+            for msg in request.messages:
+                self.history.append({"role": "user", "content": msg.content})
+            messages.extend(self.history)
+        else:
+            for msg in request.messages:
+                messages.append({"role": "user", "content": msg.content})
+
+        # 先查两级缓存：完全相同的(系统提示, 消息)不再round-trip到LLM。
+        # 请求不带消息时没有"最后一条用户消息"：语义缓存层跳过，
+        # prompt退化为系统提示（与基线把系统消息放在首位的行为一致）
+        key = self._cache_key(self._system, messages)
+        last_user_content = messages[-1]["content"] if messages else None
+        if self._cache_size > 0:
+            cached = await self.alookup(key, last_user_content)
+            if cached is not None:
+                self.commit_assistant_reply(cached)
+                return {"raw_response": cached}
+
         llm_response = await self.call_llm(
-            prompt=messages[-1]["content"],
-            system_prompt=self.roles[self.current_role]["system_prompt"],
+            prompt=last_user_content if last_user_content is not None else self._system,
+            system_prompt=self._system,
             messages=messages,
             stream=False
         )
-        
-        # 保持两次prompt注入（消息列表+独立参数）确保模型遵循角色设定
-        # 使用当前实例的角色名称
+
+        # assistant回复提交进历史，保持(user, assistant)对完整
+        self.commit_assistant_reply(llm_response)
+
+        # 写入缓存供后续相同请求复用
+        if self._cache_size > 0:
+            await self.aupdate(key, llm_response, last_user_content)
+
         # 直接返回原始响应，解析和工具调用交给专门模块
         return {
             "raw_response": llm_response  # 仅返回原始响应
         }
 
+    async def process_chat_requests(self, requests, semaphore=None):
+        """并发处理一批相互独立的聊天请求
+
+        N个请求的底层call_llm协程用asyncio.gather同时发出，
+        总耗时从Σ(单次延迟)降为约max(单次延迟)。
+        调用方应优先使用本方法，而不是在Python循环里逐个await
+        process_chat_request。仅适用于无状态模式（有状态模式下
+        并发追加共享历史会交错）。
+
+        :param requests: 请求对象列表（每项带messages属性）
+        :param semaphore: 可选的asyncio.Semaphore，用于限制并发数
+        :return: 与requests顺序对应的结果列表
+        """
+        if semaphore is None:
+            return list(await asyncio.gather(
+                *(self.process_chat_request(req) for req in requests)))
+
+        async def _one(req):
+            async with semaphore:
+                return await self.process_chat_request(req)
+
+        return list(await asyncio.gather(*(_one(req) for req in requests)))
+
     # 完全移除与解析/工具相关的方法
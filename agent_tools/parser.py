@@ -41,6 +41,20 @@ from dataclasses import dataclass
 import logging
 import ast
 
+# 条件导入orjson（C实现的解析器，大JSON块快2-5倍），缺失时回退stdlib
+try:
+    import orjson
+
+    def _loads(raw):
+        # orjson直接吃bytes，先编码可省掉其内部的一次解码
+        return orjson.loads(raw.encode("utf-8") if isinstance(raw, str) else raw)
+except ImportError:
+    _loads = json.loads
+
+# 代码块正则在模块导入时编译一次；group(1)是可选的json语言标记，
+# group(2)是块内容
+_CODE_BLOCK_RE = re.compile(r'```(json)?\s*(.*?)```', re.DOTALL)
+
 @dataclass
 class ParsedResponse:
     thought: str
@@ -62,24 +76,25 @@ class ApiCallResponseParser(BaseResponseParser):
 
     def parse(self, response: str) -> ParsedResponse:
         result = ParsedResponse(thought="", tool_calls=None, api_call=None)
-        
+
         # 添加调试日志
         self.logger.debug(f"开始解析响应:\n{response}")
-        
-        # 提取自然语言思考过程
-        non_code_content = re.sub(r'```.*?```', '', response, flags=re.DOTALL)
-        result.thought = '\n'.join([line.strip() for line in non_code_content.split('\n') if line.strip()])
-        
-        # 使用更宽松的正则表达式匹配 JSON 块
-        json_blocks = re.findall(r'```(?:json)?\s*({\s*"tool_calls"[\s\S]*?})\s*```', response, flags=re.DOTALL)
-        self.logger.debug(f"找到的 JSON 块: {json_blocks}")  # 添加调试日志
-        
-        for block in json_blocks:
+
+        # 单次扫描：代码块之外的片段累积为思考过程，
+        # 代码块本身作为候选JSON块就地解析（不再对全文各扫一遍）
+        thought_parts = []
+        last_end = 0
+        for match in _CODE_BLOCK_RE.finditer(response):
+            thought_parts.append(response[last_end:match.start()])
+            last_end = match.end()
+
+            cleaned_block = match.group(2).strip()
+            if not (cleaned_block.startswith("{") and "tool_calls" in cleaned_block):
+                continue
             try:
-                cleaned_block = block.strip()
                 self.logger.debug(f"尝试解析 JSON 块:\n{cleaned_block}")  # 添加调试日志
-                parsed = json.loads(cleaned_block)
-                
+                parsed = _loads(cleaned_block)
+
                 if "tool_calls" in parsed:
                     for tc in parsed["tool_calls"]:
                         if self._is_valid_tool_call(tc):
@@ -88,7 +103,7 @@ class ApiCallResponseParser(BaseResponseParser):
                                 "parameters": tc["parameters"]
                             }
                             result.tool_calls = [validated_call]
-                            
+
                             if tc["tool_name"] == "api_call":
                                 result.api_call = tc["parameters"]
                                 self.logger.debug(f"成功解析出 API 调用: {tc['parameters']}")  # 添加调试日志
@@ -96,7 +111,12 @@ class ApiCallResponseParser(BaseResponseParser):
             except Exception as e:
                 self.logger.debug(f"JSON解析失败: {str(e)}")
                 continue
-        
+        thought_parts.append(response[last_end:])
+
+        non_code_content = "".join(thought_parts)
+        result.thought = '\n'.join(
+            line.strip() for line in non_code_content.splitlines() if line.strip())
+
         return result
 
     def _is_valid_tool_call(self, tool_call: Dict) -> bool:
@@ -132,32 +152,30 @@ class DefaultResponseParser(BaseResponseParser):
         tool_calls = None
         
         try:
-            # 1. 先找到最后一个 json 代码块
-            last_json_block_end = response.rfind('```')
-            if last_json_block_end != -1:
-                # 从结尾往前找到对应的开始标记
-                last_json_block_start = response.rfind('```json', 0, last_json_block_end)
-                if last_json_block_start != -1:
-                    # 提取 JSON 内容
-                    json_str = response[last_json_block_start + 7:last_json_block_end].strip()
-                    logger.debug(f"提取到的 JSON 字符串长度: {len(json_str)}")
-                    
-                    # 解析 JSON
-                    parsed = json.loads(json_str)
-                    if isinstance(parsed, dict) and "tool_calls" in parsed:
-                        tool_calls = parsed["tool_calls"]
-                        logger.debug(f"成功解析出 tool_calls")
-                    
-                    # 提取思考过程（JSON块之前的所有内容）
-                    thought = response[:last_json_block_start].strip()
-                else:
-                    # 没有找到 ```json 开始标记，可能是普通文本响应
-                    thought = response.strip()
+            # 1. 单次正向扫描找到最后一个代码块（不再做两次rfind反向扫描）
+            last = None
+            for match in _CODE_BLOCK_RE.finditer(response):
+                last = match
+
+            if last is not None and last.group(1) == "json":
+                # 提取 JSON 内容
+                json_str = last.group(2).strip()
+                logger.debug(f"提取到的 JSON 字符串长度: {len(json_str)}")
+
+                # 解析 JSON
+                parsed = _loads(json_str)
+                if isinstance(parsed, dict) and "tool_calls" in parsed:
+                    tool_calls = parsed["tool_calls"]
+                    logger.debug(f"成功解析出 tool_calls")
+
+                # 提取思考过程（JSON块之前的所有内容）
+                thought = response[:last.start()].strip()
             else:
-                # 没有代码块，整个响应都是思考过程
+                # 没有 json 代码块，整个响应都是思考过程
                 thought = response.strip()
                 
-        except json.JSONDecodeError as e:
+        except ValueError as e:
+            # 覆盖json.JSONDecodeError和orjson.JSONDecodeError（均为ValueError子类）
             logger.error(f"JSON 解析失败: {str(e)}")
             # JSON 解析失败时，将整个响应视为思考过程
             thought = response.strip()
@@ -0,0 +1,321 @@
+"""
+HTTP会话管理器
+
+职责：
+1. 为APICallTool等工具提供可复用的HTTP会话
+2. aiohttp可用时提供共享的异步会话（并发工具调用真正在事件循环上重叠）
+3. aiohttp缺失时回退到requests.Session
+
+使用方式：
+>>> manager = SessionManager()
+>>> tool = APICallTool(manager)
+"""
+import asyncio
+import atexit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 条件导入aiohttp，缺失时回退到阻塞的requests路径
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# 条件导入aiolimiter，缺失时不做速率限制
+try:
+    from aiolimiter import AsyncLimiter
+except ImportError:
+    AsyncLimiter = None
+
+
+class _ResizableSemaphore:
+    """容量可在线调整的信号量
+
+    不复用asyncio.Semaphore的内部计数（直接改_value会绕过它的
+    locked()/唤醒逻辑，缩容形同虚设），自己维护(容量, 在途)两个数：
+    acquire在"在途 < 容量"且无人排队时直通，否则排队等待；release
+    归还在途数后按当前容量放行等待者。缩容后在途数高于容量时，
+    新acquire一律排队、归还的permit被直接吸收，欠账随在途请求
+    结束自然还清。
+    """
+
+    def __init__(self, value: int):
+        self._size = value
+        self._held = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+
+    def locked(self) -> bool:
+        """是否已无可用permit"""
+        return self._held >= self._size
+
+    async def acquire(self) -> bool:
+        if self._held < self._size and not self._waiters:
+            self._held += 1
+            return True
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            try:
+                await fut
+            finally:
+                self._waiters.remove(fut)
+        except asyncio.CancelledError:
+            if not fut.cancelled():
+                # 已被唤醒（permit到手）却被取消：退还并让给下一位
+                self._held -= 1
+                self._wake_up_next()
+            raise
+        return True
+
+    def release(self):
+        if self._held <= 0:
+            raise ValueError("Semaphore released too many times")
+        self._held -= 1
+        self._wake_up_next()
+
+    def resize(self, new_size: int):
+        self._size = new_size
+        # 扩容后可能一次放行多个等待者；缩容只改目标，
+        # 超额的在途请求结束时欠账自动消化
+        self._wake_up_next()
+
+    def _wake_up_next(self):
+        """按当前容量放行尽可能多的等待者"""
+        for fut in self._waiters:
+            if self._held >= self._size:
+                return
+            if not fut.done():
+                self._held += 1
+                fut.set_result(True)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return None
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class SessionManager:
+    """HTTP会话管理器
+
+    会话按需懒创建并在所有工具间复用，避免每次请求重建连接池。
+    异步会话必须在事件循环内获取（get_async_session），
+    同步会话（get_session）仅作为aiohttp缺失时的回退。
+
+    并发上限按AIMD自适应：成功加性增、429/5xx乘性减，
+    把固定速率的客户端变成拥塞控制的客户端。
+    """
+
+    # AIMD参数：成功时并发+α（加性增），429/5xx时并发×β（乘性减）
+    _AIMD_ALPHA = 0.5
+    _AIMD_BETA = 0.5
+    _MIN_CONCURRENT = 2
+
+    def __init__(self, max_concurrent: int = 20,
+                 max_rate: int = 300, rate_period: float = 60):
+        """
+        :param max_concurrent: 全部工具共享的在途请求上限
+        :param max_rate: 每个host在rate_period秒内允许的最大请求数
+        :param rate_period: 速率限制的时间窗口（秒）
+        """
+        self._session: Optional[requests.Session] = None
+        self._async_session = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.max_concurrent = max_concurrent
+        self._semaphore: Optional[_ResizableSemaphore] = None
+        # AIMD当前并发目标（浮点累积，取整后作用到信号量）
+        self.concurrency = float(max_concurrent)
+        self.max_rate = max_rate
+        self.rate_period = rate_period
+        self._limiters = {}  # {host: AsyncLimiter}
+        self._atexit_registered = False
+        # 各asyncio原语当前绑定的事件循环：asyncio.run退出后循环即关闭，
+        # 绑定旧循环的会话/信号量/限速器必须随新循环重建，
+        # 否则后续调用全部报"Event loop is closed"
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._limiters_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+        """取当前运行中的事件循环（不在循环内时返回None）"""
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    @staticmethod
+    def _loop_is_stale(owner_loop, current_loop) -> bool:
+        """判断绑定在owner_loop上的原语对current_loop是否已失效"""
+        if owner_loop is None:
+            return False
+        if owner_loop.is_closed():
+            return True
+        return current_loop is not None and owner_loop is not current_loop
+
+    @property
+    def use_aiohttp(self) -> bool:
+        """异步后端是否可用"""
+        return aiohttp is not None
+
+    def get_session(self) -> requests.Session:
+        """获取共享的requests会话（回退路径）
+
+        默认适配器每个host只池化10条连接，agent场景下对同一端点的
+        高频调用会反复付TCP/TLS握手成本；这里挂载调大的连接池，
+        并对429/5xx做带退避的自动重试。
+        """
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=32,
+                pool_maxsize=128,
+                max_retries=Retry(total=3,
+                                  backoff_factor=0.2,
+                                  status_forcelist=[429, 502, 503, 504]))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def get_semaphore(self) -> _ResizableSemaphore:
+        """获取共享的并发限制信号量
+
+        所有工具实例共用同一个Semaphore，封顶在途请求数，
+        避免fan-out耗尽socket或触发上游429封禁。绑定的事件循环
+        失效时按当前AIMD并发目标重建。
+        """
+        current_loop = self._current_loop()
+        if (self._semaphore is None
+                or self._loop_is_stale(self._semaphore_loop, current_loop)):
+            self._semaphore = _ResizableSemaphore(int(self.concurrency))
+            self._semaphore_loop = current_loop
+        elif current_loop is not None and self._semaphore_loop is None:
+            # 循环外创建的信号量会绑定第一个使用它的循环，这里记下来
+            self._semaphore_loop = current_loop
+        return self._semaphore
+
+    def record_success(self):
+        """加性增：成功响应后小步提升并发目标"""
+        self._set_concurrency(min(float(self.max_concurrent),
+                                  self.concurrency + self._AIMD_ALPHA))
+
+    def record_backpressure(self):
+        """乘性减：429/5xx后把并发目标砍半"""
+        self._set_concurrency(max(float(self._MIN_CONCURRENT),
+                                  self.concurrency * self._AIMD_BETA))
+
+    def _set_concurrency(self, value: float):
+        self.concurrency = value
+        if self._semaphore is not None:
+            self._semaphore.resize(int(value))
+
+    def get_limiter(self, host: str):
+        """获取按host共享的令牌桶限速器
+
+        限速器跨调用复用，计数窗口才连续有效；把请求pace在上游RPM
+        配额内，省掉429和由此浪费的round-trip。aiolimiter缺失时返回
+        None（不限速）。限速器同样绑定事件循环，循环失效时整组重建
+        （跨循环复用AsyncLimiter是未定义行为）。
+        """
+        if AsyncLimiter is None:
+            return None
+        current_loop = self._current_loop()
+        if self._loop_is_stale(self._limiters_loop, current_loop):
+            self._limiters = {}
+            self._limiters_loop = current_loop
+        elif current_loop is not None and self._limiters_loop is None:
+            self._limiters_loop = current_loop
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = AsyncLimiter(max_rate=self.max_rate,
+                                   time_period=self.rate_period)
+            self._limiters[host] = limiter
+        return limiter
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """获取共享的有界线程池（回退路径的阻塞请求在其中执行）
+
+        所有工具共用一个小线程池，避免每个调用各起线程造成线程churn。
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8,
+                                                thread_name_prefix="api-call")
+        return self._executor
+
+    async def get_async_session(self):
+        """获取共享的aiohttp会话（须在事件循环内调用）
+
+        整个管理器只建一个TCPConnector+ClientSession，所有工具实例
+        复用同一个连接池——连接/DNS/keepalive都只付一次成本。
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp未安装，无法使用异步会话")
+        current_loop = asyncio.get_running_loop()
+        if (self._async_session is None or self._async_session.closed
+                or self._session_loop is not current_loop):
+            # 换了事件循环：绑定旧循环的会话没法在新循环上await close
+            # （它的循环通常已随asyncio.run关闭），尽力同步关掉连接器的
+            # 传输并detach标记会话已关闭，然后重建
+            old_session = self._async_session
+            if old_session is not None and not old_session.closed:
+                try:
+                    # 新版aiohttp的connector.close是协程，没法在别的循环上
+                    # await；内部的同步_close对已关闭的循环有显式处理，
+                    # 优先用它做兜底清理
+                    close_sync = getattr(old_session.connector, "_close", None)
+                    if close_sync is not None:
+                        close_sync()
+                    else:
+                        waiter = old_session.connector.close()
+                        if asyncio.iscoroutine(waiter):
+                            waiter.close()
+                    old_session.detach()
+                except Exception:
+                    pass
+            connector = aiohttp.TCPConnector(limit=100,
+                                             limit_per_host=32,
+                                             ttl_dns_cache=300,
+                                             keepalive_timeout=60)
+            self._async_session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30))
+            self._session_loop = current_loop
+            if not self._atexit_registered:
+                atexit.register(self._close_at_exit)
+                self._atexit_registered = True
+        return self._async_session
+
+    def _close_at_exit(self):
+        """进程退出时兜底关闭异步会话（正常路径应显式await aclose）"""
+        if self._async_session is not None and not self._async_session.closed:
+            try:
+                asyncio.run(self._async_session.close())
+            except RuntimeError:
+                pass
+        self._async_session = None
+
+    async def aclose(self):
+        """关闭异步会话（应用关闭时调用）"""
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+
+
+# 进程级默认管理器：不显式注入时所有APICallTool共享同一连接池
+_default_manager: Optional[SessionManager] = None
+
+
+def get_default_session_manager() -> SessionManager:
+    """获取进程级默认会话管理器"""
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = SessionManager()
+    return _default_manager
@@ -5,22 +5,110 @@
 主要用于决定是否需要继续与Claude进行交互。
 """
 
+import asyncio
+import sys
+import threading
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from itertools import islice
+from types import SimpleNamespace
 from typing import List, Tuple, Dict, Any, Optional
 
+
+@dataclass(slots=True)
+class _Request:
+    """传给LLMService.process_chat_request的轻量请求对象"""
+    messages: list
+
+# 任务状态常量（intern后下游相等比较走指针比较）
+COMPLETED = sys.intern("COMPLETED")
+NEEDS_MORE_INFO = sys.intern("NEEDS_MORE_INFO")
+CONTINUE = sys.intern("CONTINUE")
+
+# 合法状态集合，供响应解析的快路径做一次哈希查找
+_STATES = frozenset((COMPLETED, NEEDS_MORE_INFO, CONTINUE))
+
+# 分析提示模板提升到模块级，避免每次调用重建多KB的f-string
+_ANALYZER_TEMPLATE = """
+        作为对话分析专家，请判断以下AI回复是否完成了用户的任务或问题。
+
+        原始请求:
+        {original_request}
+
+        对话历史摘要:
+        {history_summary}
+
+        最新AI回复:
+        {last_response}
+
+        请分析AI回复是否:
+        1. 完全回答了用户问题并完成了任务
+        2. 正在询问更多信息以便继续
+        3. 已经开始回答但尚未完成，需要继续
+
+        请只返回以下状态之一:
+        - COMPLETED: 任务已完成，不需要继续对话
+        - NEEDS_MORE_INFO: 需要用户提供更多信息
+        - CONTINUE: 任务进行中，需要继续
+        """
+
+# 条件导入pyahocorasick，缺失时回退到逐词substring扫描
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 供同步入口复用的后台事件循环（懒启动，整个进程一个），
+# 避免每次同步调用都新建/销毁一个事件循环
+_BG_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_BG_LOOP_LOCK = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """懒启动进程级后台事件循环（守护线程中运行）"""
+    global _BG_LOOP
+    with _BG_LOOP_LOCK:
+        if _BG_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever,
+                             name="task-analyzer-loop",
+                             daemon=True).start()
+            _BG_LOOP = loop
+    return _BG_LOOP
+
+
+def _run_sync(coro):
+    """在同步上下文中执行协程
+
+    没有运行中的事件循环时直接用asyncio.run；
+    已在事件循环内被同步调用时，转发到共享后台循环执行，
+    避免"loop within loop"错误，也不再反复重建循环。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+    return future.result()
+
+
 class BaseTaskAnalyzer(ABC):
-    """任务分析器抽象基类"""
-    
+    """任务分析器抽象基类
+
+    异步调用方请优先使用aanalyze；analyze是同步兼容入口，
+    子类可按需覆盖其中之一（默认互相委托）。
+    """
+
     @abstractmethod
-    def analyze(self, 
-                conversation_history: List[Tuple[str, str]], 
+    def analyze(self,
+                conversation_history: List[Tuple[str, str]],
                 last_response: str) -> str:
         """分析任务是否完成
-        
+
         Args:
             conversation_history: 对话历史记录，每项为(问题, 回答)对
             last_response: 最新的回答
-            
+
         Returns:
             str: 任务状态，可能的值:
                 - "COMPLETED": 任务已完成，不需要继续对话
@@ -29,6 +117,12 @@ class BaseTaskAnalyzer(ABC):
         """
         pass
 
+    async def aanalyze(self,
+                       conversation_history: List[Tuple[str, str]],
+                       last_response: str) -> str:
+        """异步分析接口（推荐），默认委托同步analyze"""
+        return self.analyze(conversation_history, last_response)
+
 
 class RuleBasedAnalyzer(BaseTaskAnalyzer):
     """基于规则的任务分析器
@@ -65,26 +159,58 @@ class RuleBasedAnalyzer(BaseTaskAnalyzer):
             "?",
             "？"
         ]
-    
+
+        # 构建一次Aho-Corasick自动机：一次线性扫描覆盖全部指示词，
+        # 代替对每个指示词各扫一遍整个回复；完成指示词优先级更高
+        if ahocorasick is not None:
+            self._ac = ahocorasick.Automaton()
+            for indicator in self.completion_indicators:
+                self._ac.add_word(indicator, (0, COMPLETED))
+            for indicator in self.needs_info_indicators:
+                if not self._ac.exists(indicator):
+                    self._ac.add_word(indicator, (1, NEEDS_MORE_INFO))
+            self._ac.make_automaton()
+        else:
+            self._ac = None
+
     def analyze(self, conversation_history: List[Tuple[str, str]], last_response: str) -> str:
         """使用规则判断任务状态"""
-        
+
         # 任务刚刚开始
         if len(conversation_history) <= 1:
-            return "CONTINUE"
-            
-        # 检查是否包含完成指示词
-        for indicator in self.completion_indicators:
-            if indicator in last_response:
-                return "COMPLETED"
-                
-        # 检查是否需要更多信息
-        for indicator in self.needs_info_indicators:
-            if indicator in last_response:
-                return "NEEDS_MORE_INFO"
-                
+            return CONTINUE
+
+        # 完成语/追问语基本都出现在回复结尾，只扫尾部窗口即可，
+        # 长回复可少触达约10倍的字节；问号例外，仍检查全文
+        tail = last_response[-400:] if len(last_response) > 400 else last_response
+
+        # 优先走Aho-Corasick：对尾部窗口只扫一遍，按优先级取最终状态
+        if self._ac is not None:
+            best = None
+            for _, (priority, status) in self._ac.iter(tail):
+                if priority == 0:
+                    return status
+                if best is None:
+                    best = status
+            if best is not None:
+                return best
+        else:
+            # 回退路径：检查是否包含完成指示词
+            for indicator in self.completion_indicators:
+                if indicator in tail:
+                    return COMPLETED
+
+            # 检查是否需要更多信息
+            for indicator in self.needs_info_indicators:
+                if indicator in tail:
+                    return NEEDS_MORE_INFO
+
+        # 问句可能出现在回复任意位置，问号单独扫一遍全文
+        if "?" in last_response or "？" in last_response:
+            return NEEDS_MORE_INFO
+
         # 默认继续
-        return "CONTINUE"
+        return CONTINUE
 
 
 class LLMTaskAnalyzer(BaseTaskAnalyzer):
@@ -98,16 +224,30 @@ class LLMTaskAnalyzer(BaseTaskAnalyzer):
     
     def __init__(self, llm_service):
         self.llm_service = llm_service
-        
-    async def analyze(self, conversation_history: List[Tuple[str, str]], last_response: str) -> str:
+
+    def analyze(self, conversation_history: List[Tuple[str, str]], last_response: str) -> str:
+        """同步兼容入口，转发到aanalyze"""
+        return _run_sync(self.aanalyze(conversation_history, last_response))
+
+    async def batch_analyze(self,
+                            items: List[Tuple[List[Tuple[str, str]], str]]) -> List[str]:
+        """并发分析一批独立对话
+
+        :param items: (conversation_history, last_response)列表
+        :return: 与items顺序对应的任务状态列表
+        """
+        return list(await asyncio.gather(
+            *(self.aanalyze(history, last_response)
+              for history, last_response in items)))
+
+    async def aanalyze(self, conversation_history: List[Tuple[str, str]], last_response: str) -> str:
         """使用LLM判断任务是否完成"""
         
         prompt = self._build_analyzer_prompt(conversation_history, last_response)
-        
-        # 构建请求对象
-        request = type('Request', (), {})()
-        request.messages = [type('Message', (), {'content': prompt})]
-        
+
+        # 构建请求对象（复用模块级dataclass，不再每次动态造类）
+        request = _Request(messages=[SimpleNamespace(content=prompt)])
+
         # 调用LLM
         result = await self.llm_service.process_chat_request(request)
         
@@ -121,52 +261,40 @@ class LLMTaskAnalyzer(BaseTaskAnalyzer):
         # 获取原始请求
         original_request = conversation_history[0][0] if conversation_history else "无"
         
-        # 构建对话历史摘要
-        history_summary = "\n".join([
-            f"用户: {q}\nAI: {a[:100]}..." 
-            for q, a in conversation_history[:-1]
-        ]) if len(conversation_history) > 1 else "无之前对话"
-        
-        return f"""
-        作为对话分析专家，请判断以下AI回复是否完成了用户的任务或问题。
-        
-        原始请求: 
-        {original_request}
-        
-        对话历史摘要:
-        {history_summary}
-        
-        最新AI回复:
-        {last_response}
-        
-        请分析AI回复是否:
-        1. 完全回答了用户问题并完成了任务
-        2. 正在询问更多信息以便继续
-        3. 已经开始回答但尚未完成，需要继续
-        
-        请只返回以下状态之一:
-        - COMPLETED: 任务已完成，不需要继续对话
-        - NEEDS_MORE_INFO: 需要用户提供更多信息
-        - CONTINUE: 任务进行中，需要继续
-        """
+        # 构建对话历史摘要（islice避免对长历史做切片拷贝）
+        if len(conversation_history) > 1:
+            history_summary = "\n".join(
+                f"用户: {q}\nAI: {a[:100]}..."
+                for q, a in islice(conversation_history,
+                                   len(conversation_history) - 1))
+        else:
+            history_summary = "无之前对话"
+
+        return _ANALYZER_TEMPLATE.format(
+            original_request=original_request,
+            history_summary=history_summary,
+            last_response=last_response)
         
     def _parse_analyzer_response(self, response):
         """解析分析器响应"""
-        valid_states = {"COMPLETED", "NEEDS_MORE_INFO", "CONTINUE"}
-        
-        # 尝试直接匹配
-        for state in valid_states:
+        # 快路径：模型被要求只返回单个状态词，一次哈希查找即可命中
+        normalized = response.strip().upper()
+        if normalized in _STATES:
+            return sys.intern(normalized)
+
+        # 慢路径：状态词嵌在解释性文本中，逐个substring匹配
+        for state in (COMPLETED, NEEDS_MORE_INFO, CONTINUE):
             if state in response:
                 return state
-        
+
         # 如果没有直接匹配，尝试判断
         if "完成" in response or "已完成" in response or "已解决" in response:
-            return "COMPLETED"
+            return COMPLETED
         elif "需要更多" in response or "需要用户" in response or "需要提供" in response:
-            return "NEEDS_MORE_INFO"
+            return NEEDS_MORE_INFO
         else:
             # 默认继续
-            return "CONTINUE"
+            return CONTINUE
 
 
 def get_default_analyzer() -> BaseTaskAnalyzer:
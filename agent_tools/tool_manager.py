@@ -36,7 +36,10 @@ class ToolManager:
     def __init__(self):
         # 工具注册表：{工具名称: 工具实例}
         self._tools: Dict[str, BaseTool] = {}
-        
+        # 调度表：{工具名称: (validate_parameters, execute, 工具实例)}
+        # 绑定方法在注册时解析一次，热路径上省掉逐次属性查找
+        self._dispatch: Dict[str, Tuple] = {}
+
     def register_tool(self, name: str, tool: BaseTool):
         """注册工具到管理系统
         Args:
@@ -44,14 +47,16 @@ class ToolManager:
             tool: 实现BaseTool的具体工具实例
         """
         self._tools[name] = tool
-        
+        self._dispatch[name] = (tool.validate_parameters, tool.execute, tool)
+
     async def execute_tool(self, tool_name: str, params: Dict):
-        tool = self._tools.get(tool_name)
-        if not tool:
+        entry = self._dispatch.get(tool_name)
+        if entry is None:
             return ToolCallResult(success=False, error="工具未注册")
-        
+        validate_parameters, execute, _ = entry
+
         # 修改后的验证逻辑
-        is_valid, error = tool.validate_parameters(params)
+        is_valid, error = validate_parameters(params)
         if not is_valid:
             return ToolCallResult(
                 success=False,
@@ -61,5 +66,5 @@ class ToolManager:
                     "invalid_params": params
                 }
             )
-        
-        return await tool.execute(params) 
\ No newline at end of file
+
+        return await execute(params)
\ No newline at end of file
@@ -13,6 +13,16 @@
 """
 
 # -------------------------------- 基础依赖 ---------------------------------
+import asyncio
+import functools
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional, Tuple
 from dataclasses import dataclass
@@ -20,26 +30,102 @@ import requests
 import json
 from pathlib import Path  # 添加此行以导入 Path
 
+# 条件导入aiohttp，缺失时APICallTool回退到阻塞的requests路径
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# 条件导入orjson（C实现的解析器，大响应体快2-6倍），缺失时回退stdlib；
+# 两者都直接吃bytes，跳过requests/aiohttp的content-type嗅探
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# 条件导入aiofiles，缺失时文件I/O经线程池offload
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+
+# APICallTool热路径常量：默认请求头与带请求体的方法集合
+_DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+_WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+# 已确认存在的目录集合：同一目录树下批量建文件时，
+# mkdir(parents=True)的逐级syscall链只付一次
+_KNOWN_DIRS: set = set()
+
+
+@functools.lru_cache(maxsize=4096)
+def _resolve_cached(path: str) -> Path:
+    return Path(path).resolve()
+
+
+def _resolve(path: str) -> Path:
+    """解析路径，绝对路径按输入字符串缓存
+
+    Path.resolve会对每级父目录做stat/readlink，深路径或网络文件系统上
+    每次工具调用要付几十个系统调用；同一绝对路径反复操作时直接命中
+    缓存。相对路径的解析结果取决于当前工作目录，不能进缓存（cwd变了
+    会静默写错文件），每次都重新解析。缓存条目也不感知符号链接的改向，
+    绝对路径里有会变化的symlink时不应依赖此缓存。
+    """
+    if not os.path.isabs(path):
+        return Path(path).resolve()
+    return _resolve_cached(path)
+
+
+async def _read_bytes(path: Path) -> bytes:
+    """异步读取文件原始字节，不阻塞事件循环"""
+    if aiofiles is not None:
+        async with aiofiles.open(path, "rb") as f:
+            return await f.read()
+    return await asyncio.to_thread(path.read_bytes)
+
+
+async def _read_text(path: Path) -> str:
+    """异步读取文本文件，不阻塞事件循环
+
+    整块读入后一次性decode，避免文本模式的增量解码开销。
+    """
+    return (await _read_bytes(path)).decode("utf-8")
+
+
+async def _write_text(path: Path, content: str):
+    """异步写入文本文件，不阻塞事件循环"""
+    if aiofiles is not None:
+        async with aiofiles.open(path, "w", encoding="utf-8") as f:
+            await f.write(content)
+    else:
+        await asyncio.to_thread(path.write_text, content, encoding="utf-8")
+
 # ============================== 核心数据定义 ==============================
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ToolCallResult:
     """
     ▛▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▀▛
-    工具调用结果容器
-    
+    工具调用结果容器（slots省掉每实例__dict__，frozen保证结果不可变）
+
     使用示例：
     >>> success_result = ToolCallResult(True, {"data": ...})
     >>> error_result = ToolCallResult(False, None, "Timeout Error")
-    
+
     属性说明：
     - success : 调用是否成功（布尔值）
     - result  : 成功时的返回结果（任意类型）
     - error   : 失败时的错误描述（字符串）
+    - details : 失败时的附加上下文（字典，可选）
     ▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔▔
     """
     success: bool
-    result: Any
+    result: Any = None
     error: Optional[str] = None
+    details: Optional[Dict] = None
 
 
 # ============================== 抽象接口层 ================================
@@ -90,12 +176,34 @@ class APICallTool(BaseTool):
     | body    | 否   | dict   | None   | 请求体(JSON格式)      |
     | params  | 否   | dict   | {}     | URL查询参数           |
     """
-    VALID_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+    VALID_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+
+    # GET响应缓存：容量与默认TTL（响应带Cache-Control: max-age时按其覆盖）
+    _GET_CACHE_SIZE = 1024
+    _GET_CACHE_TTL = 300.0
+    _MAX_AGE_RE = re.compile(r"max-age=(\d+)")
 
-    def __init__(self, session_manager):
+    def __init__(self, session_manager=None):
+        # 不显式注入时使用进程级默认管理器，全部实例共享一个连接池
+        if session_manager is None:
+            from .session_manager import get_default_session_manager
+            session_manager = get_default_session_manager()
         self.session_manager = session_manager
-        self.session = session_manager.get_session()
-        
+        # aiohttp可用且管理器支持异步会话时走异步路径（会话在execute内懒获取，
+        # 必须在事件循环里创建）；否则保留原有requests会话
+        self._use_aiohttp = (aiohttp is not None and
+                             getattr(session_manager, "get_async_session", None) is not None)
+        self.session = None if self._use_aiohttp else session_manager.get_session()
+        # 管理器是否提供并发限制信号量。信号量对象本身不能在这里缓存：
+        # 它绑定事件循环，跨asyncio.run复用会报"bound to a different
+        # event loop"，每次execute时向管理器取（管理器负责按循环重建）
+        self._has_semaphore = getattr(session_manager, "get_semaphore", None) is not None
+        # GET响应的TTL+LRU缓存：agent短窗口内反复拉同一份文档/schema时
+        # 直接零RTT返回；{键: (过期时刻, ToolCallResult, ETag, Last-Modified)}
+        self._get_cache: "OrderedDict[bytes, Tuple[float, ToolCallResult, Optional[str], Optional[str]]]" = OrderedDict()
+        # 预编译的端点调用闭包：{(url, method, 冻结headers): callable}
+        self._compiled: Dict[Tuple, Any] = {}
+
     async def execute(self, params: Dict[str, Any]) -> ToolCallResult:
         # 参数校验
         if not (url := params.get("url")):
@@ -104,45 +212,255 @@ class APICallTool(BaseTool):
                 result=None,
                 error="缺少必要参数: url"
             )
-            
-        # 参数预处理
+
+        # 参数预处理：调用方没给headers时直接复用模块级默认dict，
+        # 不在热路径上做无谓的合并分配
         method = params.get("method", "GET").upper()
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-            **params.get("headers", {})
+        caller_headers = params.get("headers")
+        headers = ({**_DEFAULT_HEADERS, **caller_headers}
+                   if caller_headers else _DEFAULT_HEADERS)
+
+        # 构建请求参数
+        request_args = {
+            "method": method,
+            "url": url,
+            "headers": headers
         }
-        
-        try:
-            # 构建请求参数
+
+        # 根据请求方法添加相应参数
+        if method in _WRITE_METHODS:
+            request_args["json"] = params.get("body")
+        else:
+            request_args["params"] = params.get("params", {})
+
+        # GET走TTL缓存：命中直接零RTT返回；过期条目若有ETag/Last-Modified
+        # 验证器，则带上条件头做revalidation，内容未变时上游只回无body的304
+        cache_key = None
+        if method == "GET":
+            cache_key = self._get_cache_key(url, request_args["params"], headers)
+            cached = self._get_cache_lookup(cache_key)
+            if cached is not None:
+                return cached
+            conditional = self._get_conditional_headers(cache_key)
+            if conditional:
+                request_args["headers"] = {**headers, **conditional}
+
+        # 并发上限：同一时刻的在途请求数封顶，防止fan-out耗尽socket
+        if self._has_semaphore:
+            async with self.session_manager.get_semaphore():
+                return await self._send_limited(url, request_args, cache_key)
+        return await self._send_limited(url, request_args, cache_key)
+
+    def compile(self, url: str, method: str = "GET", headers: Optional[Dict] = None):
+        """为固定端点预编译调用闭包
+
+        agent部署通常反复调用同一批端点；这里把方法大写、请求头合并、
+        方法集合判断、URL的host解析等不变量提前算好，返回的
+        async callable(body=None, params=None)热路径上只剩构造一个
+        request_args和真正的网络调用。编译结果按
+        (url, method, headers)缓存复用。注意：编译路径不经过GET的
+        TTL缓存；信号量/限速器绑定事件循环，不能编译期捕获，
+        每次调用时向管理器取（管理器负责按循环重建）。
+        """
+        cache_key = (url, method.upper(),
+                     frozenset(headers.items()) if headers else None)
+        compiled = self._compiled.get(cache_key)
+        if compiled is not None:
+            return compiled
+
+        method = method.upper()
+        merged_headers = {**_DEFAULT_HEADERS, **headers} if headers else _DEFAULT_HEADERS
+        is_write = method in _WRITE_METHODS
+        netloc = urlsplit(url).netloc
+        has_limiter = getattr(self.session_manager, "get_limiter", None) is not None
+        has_semaphore = self._has_semaphore
+
+        async def _call(body=None, params=None) -> ToolCallResult:
             request_args = {
                 "method": method,
                 "url": url,
-                "headers": headers
+                "headers": merged_headers
             }
-            
-            # 根据请求方法添加相应参数
-            if method in {"POST", "PUT", "PATCH", "DELETE"}:
-                request_args["json"] = params.get("body")
+            if is_write:
+                request_args["json"] = body
             else:
-                request_args["params"] = params.get("params", {})
-     
-            # 获取会话并执行请求
-            response = self.session.request(**request_args)
-            response.raise_for_status()
-            
-            # 处理响应数据
+                request_args["params"] = params or {}
+
+            limiter = (self.session_manager.get_limiter(netloc)
+                       if has_limiter else None)
+            if has_semaphore:
+                async with self.session_manager.get_semaphore():
+                    if limiter is not None:
+                        async with limiter:
+                            return await self._send(request_args)
+                    return await self._send(request_args)
+            if limiter is not None:
+                async with limiter:
+                    return await self._send(request_args)
+            return await self._send(request_args)
+
+        self._compiled[cache_key] = _call
+        return _call
+
+    async def execute_many(self, params_list) -> list:
+        """并发执行一批API调用
+
+        N个独立调用经asyncio.gather同时发出，RTT相互重叠，连接池
+        摊薄TLS握手成本；共享的Semaphore/限速器保证fan-out有界。
+        个别调用抛出的异常会被包装成失败的ToolCallResult，
+        结果列表与params_list顺序一致、形态统一。
+        """
+        results = await asyncio.gather(
+            *(self.execute(params) for params in params_list),
+            return_exceptions=True)
+        return [result if isinstance(result, ToolCallResult)
+                else ToolCallResult(success=False, result=None, error=str(result))
+                for result in results]
+
+    def _get_cache_key(self, url: str, params, headers) -> bytes:
+        """对(url, 查询参数, 请求头)计算稳定的缓存键"""
+        payload = json.dumps([url, params, headers],
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+    def _get_cache_lookup(self, key: bytes) -> Optional[ToolCallResult]:
+        """查询GET缓存，命中未过期的条目直接返回"""
+        entry = self._get_cache.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            self._get_cache.move_to_end(key)
+            return entry[1]
+        return None
+
+    def _get_conditional_headers(self, key: bytes) -> Dict[str, str]:
+        """为过期但带验证器的缓存条目生成条件请求头"""
+        entry = self._get_cache.get(key)
+        if entry is None:
+            return {}
+        conditional = {}
+        if entry[2]:
+            conditional["If-None-Match"] = entry[2]
+        if entry[3]:
+            conditional["If-Modified-Since"] = entry[3]
+        return conditional
+
+    def _response_ttl(self, headers) -> float:
+        """从响应头取TTL；没有Cache-Control: max-age时用默认值"""
+        match = self._MAX_AGE_RE.search(headers.get("Cache-Control", ""))
+        return float(match.group(1)) if match else self._GET_CACHE_TTL
+
+    def _get_cache_store(self, key: bytes, result: ToolCallResult, headers):
+        """写入GET缓存，连同ETag/Last-Modified验证器一起保存"""
+        self._get_cache[key] = (time.monotonic() + self._response_ttl(headers),
+                                result,
+                                headers.get("ETag"),
+                                headers.get("Last-Modified"))
+        self._get_cache.move_to_end(key)
+        while len(self._get_cache) > self._GET_CACHE_SIZE:
+            self._get_cache.popitem(last=False)
+
+    def _get_cache_refresh(self, key: bytes, headers) -> Optional[ToolCallResult]:
+        """304 Not Modified：复用缓存内容并刷新其TTL"""
+        entry = self._get_cache.get(key)
+        if entry is None:
+            return None
+        self._get_cache[key] = (time.monotonic() + self._response_ttl(headers),
+                                entry[1], entry[2], entry[3])
+        self._get_cache.move_to_end(key)
+        return entry[1]
+
+    async def _send_limited(self, url: str, request_args: Dict[str, Any],
+                            cache_key: Optional[bytes] = None) -> ToolCallResult:
+        """按host限速后发送：请求pace在上游RPM配额内，避免429"""
+        limiter = (self.session_manager.get_limiter(urlsplit(url).netloc)
+                   if getattr(self.session_manager, "get_limiter", None) is not None
+                   else None)
+        if limiter is not None:
+            async with limiter:
+                return await self._send(request_args, cache_key)
+        return await self._send(request_args, cache_key)
+
+    def _record_rate_limit(self, status: int, headers) -> float:
+        """根据响应状态和限流头更新AIMD并发目标
+
+        成功加性增、429/5xx（或剩余配额耗尽）乘性减。
+
+        :return: 上游通过Retry-After要求的等待秒数（没有则为0）
+        """
+        manager = self.session_manager
+        if getattr(manager, "record_success", None) is None:
+            return 0.0
+
+        remaining = (headers.get("x-ratelimit-remaining-requests")
+                     or headers.get("anthropic-ratelimit-requests-remaining"))
+        if status == 429 or status >= 500 or remaining == "0":
+            manager.record_backpressure()
+            try:
+                return float(headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                return 0.0
+
+        # 只有2xx算成功；其余4xx既不加也不减并发目标
+        if status < 300:
+            manager.record_success()
+        return 0.0
+
+    async def _send(self, request_args: Dict[str, Any],
+                    cache_key: Optional[bytes] = None) -> ToolCallResult:
+        """按可用后端分发请求"""
+        if self._use_aiohttp:
+            return await self._execute_aiohttp(request_args, cache_key)
+        return await self._execute_requests(request_args, cache_key)
+
+    async def _execute_requests(self, request_args: Dict[str, Any],
+                                cache_key: Optional[bytes] = None) -> ToolCallResult:
+        """回退路径：阻塞的requests调用放进共享线程池执行，
+        事件循环在round-trip期间继续推进其他协程
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            executor = (self.session_manager.get_executor()
+                        if getattr(self.session_manager, "get_executor", None) is not None
+                        else None)
+            response = await loop.run_in_executor(
+                executor, functools.partial(self.session.request, **request_args))
+
+            # 限流头反馈进AIMD；上游明确给了Retry-After就先等满再返回，
+            # 让调用方的重试落在有效配额上
+            retry_after = self._record_rate_limit(response.status_code, response.headers)
+            if retry_after > 0:
+                await asyncio.sleep(retry_after)
+
+            # 304：内容未变，复用缓存并刷新TTL（省掉整个响应体的传输）
+            if response.status_code == 304 and cache_key is not None:
+                cached = self._get_cache_refresh(cache_key, response.headers)
+                if cached is not None:
+                    return cached
+
+            # 4xx/5xx对agent API是常态而非异常：直接按状态码分支构造
+            # 失败结果，省掉raise_for_status每次抛出/捕获的traceback开销
+            if response.status_code >= 400:
+                return ToolCallResult(
+                    success=False,
+                    result=None,
+                    error=f"HTTP {response.status_code}: {response.text[:512]}"
+                )
+
+            # 处理响应数据（orjson直接解析bytes，跳过content-type嗅探）
             try:
-                result = response.json() if response.content else {}
-            except json.JSONDecodeError:
+                result = _json_loads(response.content) if response.content else {}
+            except ValueError:
                 # 如果不是JSON格式，返回文本内容
                 result = {"text": response.text}
-            
-            return ToolCallResult(
+
+            tool_result = ToolCallResult(
                 success=True,
                 result=result,
                 error=None
             )
-            
+            if cache_key is not None:
+                self._get_cache_store(cache_key, tool_result, response.headers)
+            return tool_result
+
         except requests.exceptions.RequestException as e:
             return ToolCallResult(
                 success=False,
@@ -156,6 +474,67 @@ class APICallTool(BaseTool):
                 error=f"未知错误: {str(e)}"
             )
 
+    async def _execute_aiohttp(self, request_args: Dict[str, Any],
+                               cache_key: Optional[bytes] = None) -> ToolCallResult:
+        """异步执行HTTP请求
+
+        请求在事件循环上真正并发：N个并行工具调用的总耗时
+        约等于最慢一次round-trip，而不是各次之和。
+        """
+        try:
+            session = await self.session_manager.get_async_session()
+            async with session.request(**request_args) as response:
+                # 限流头反馈进AIMD；上游明确给了Retry-After就先等满再返回，
+                # 让调用方的重试落在有效配额上
+                retry_after = self._record_rate_limit(response.status, response.headers)
+                if retry_after > 0:
+                    await asyncio.sleep(retry_after)
+
+                # 304：内容未变，复用缓存并刷新TTL（省掉整个响应体的传输）
+                if response.status == 304 and cache_key is not None:
+                    cached = self._get_cache_refresh(cache_key, response.headers)
+                    if cached is not None:
+                        return cached
+
+                # 4xx/5xx对agent API是常态而非异常：直接按状态码分支构造
+                # 失败结果，省掉raise_for_status每次抛出/捕获的traceback开销
+                if response.status >= 400:
+                    return ToolCallResult(
+                        success=False,
+                        result=None,
+                        error=f"HTTP {response.status}: {(await response.text())[:512]}"
+                    )
+
+                # 处理响应数据（orjson直接解析bytes，跳过content-type嗅探）
+                try:
+                    body = await response.read()
+                    result = _json_loads(body) if body else {}
+                except ValueError:
+                    # 如果不是JSON格式，返回文本内容
+                    result = {"text": await response.text()}
+
+                tool_result = ToolCallResult(
+                    success=True,
+                    result=result,
+                    error=None
+                )
+                if cache_key is not None:
+                    self._get_cache_store(cache_key, tool_result, response.headers)
+                return tool_result
+
+        except aiohttp.ClientError as e:
+            return ToolCallResult(
+                success=False,
+                result=None,
+                error=f"请求异常: {str(e)}"
+            )
+        except Exception as e:
+            return ToolCallResult(
+                success=False,
+                result=None,
+                error=f"未知错误: {str(e)}"
+            )
+
     def validate_parameters(self, params: Dict) -> Tuple[bool, str]:
         # 具体到缺失哪个参数
         missing = [p for p in ["url", "method"] if p not in params]
@@ -205,19 +584,22 @@ class FileOperationTool(BaseTool):  # 修改类名
         # 对于 'read' 操作，可以根据实际需求增加额外的参数校验
         return True, ""
 
+    # 操作名 -> 处理方法名的调度表（类级构建一次，execute不再逐次重建）
+    _HANDLERS = {
+        "create": "_create_file",
+        "read": "_read_file",
+        "modify": "_apply_diff"
+    }
+
     async def execute(self, params: Dict[str, Any]) -> ToolCallResult:
         """统一执行入口"""
         operation = params.get("operation")
-        handlers = {
-            "create": self._create_file,
-            "read": self._read_file,
-            "modify": self._apply_diff
-        }
-        
-        if not operation or operation not in handlers:
+        handler_name = self._HANDLERS.get(operation)
+
+        if handler_name is None:
             return ToolCallResult(False, None, f"无效操作类型: {operation}")
-            
-        return await handlers[operation](params)
+
+        return await getattr(self, handler_name)(params)
 
     async def _create_file(self, params: Dict) -> ToolCallResult:
         """创建文件"""
@@ -225,9 +607,19 @@ class FileOperationTool(BaseTool):  # 修改类名
             return ToolCallResult(False, None, "缺少必要参数: path 或 content")
             
         try:
-            final_path = Path(path).resolve()
-            final_path.parent.mkdir(parents=True, exist_ok=True)
-            final_path.write_text(params["content"], encoding="utf-8")
+            final_path = _resolve(path)
+            parent = str(final_path.parent)
+            if parent not in _KNOWN_DIRS:
+                final_path.parent.mkdir(parents=True, exist_ok=True)
+                _KNOWN_DIRS.add(parent)
+            try:
+                await _write_text(final_path, params["content"])
+            except FileNotFoundError:
+                # 缓存失效（目录在两次调用之间被删了）：重建后重试一次
+                _KNOWN_DIRS.discard(parent)
+                final_path.parent.mkdir(parents=True, exist_ok=True)
+                _KNOWN_DIRS.add(parent)
+                await _write_text(final_path, params["content"])
             return ToolCallResult(True, {"path": str(final_path)})
         except Exception as e:
             return ToolCallResult(False, None, f"创建失败: {str(e)}")
@@ -238,42 +630,118 @@ class FileOperationTool(BaseTool):  # 修改类名
             return ToolCallResult(False, None, "缺少必要参数: path")
             
         try:
-            final_path = Path(path).resolve()
+            final_path = _resolve(path)
             if not final_path.exists():
                 return ToolCallResult(False, None, f"文件不存在: {path}")
                 
-            content = final_path.read_text(encoding="utf-8")
+            # binary=True时直接返回原始字节：调用方（如base64转发、再编码
+            # 进JSON）不需要str时，省掉一次UTF-8解码和再编码
+            if params.get("binary"):
+                data = await _read_bytes(final_path)
+                return ToolCallResult(True, {"bytes": data})
+
+            content = await _read_text(final_path)
             return ToolCallResult(True, {"content": content})
         except Exception as e:
             return ToolCallResult(False, None, f"读取失败: {str(e)}")
 
+    # 流式替换的读块大小
+    _DIFF_CHUNK_SIZE = 1024 * 1024
+
     async def _apply_diff(self, params: Dict) -> ToolCallResult:
-        """应用修改"""
+        """应用修改
+
+        流式扫描+临时文件+原子rename：峰值内存从2倍文件大小降到
+        O(块大小+片段长度)，写入中途崩溃也不会留下半成品文件。
+        """
         required = ["path", "original_snippet", "new_snippet"]
         if missing := [p for p in required if p not in params]:
             return ToolCallResult(False, None, f"缺少参数: {', '.join(missing)}")
-            
+
         try:
-            final_path = Path(params["path"]).resolve()
-            original = final_path.read_text(encoding="utf-8")
-            
-            if params["original_snippet"] not in original:
+            final_path = _resolve(params["path"])
+            replaced = await asyncio.to_thread(
+                self._stream_replace,
+                final_path,
+                params["original_snippet"].encode("utf-8"),
+                params["new_snippet"].encode("utf-8"))
+
+            if not replaced:
                 return ToolCallResult(
                     False,
                     None,
                     "原始片段未找到",
                     details={
-                        "expected": params["original_snippet"],
-                        "actual": original
+                        "expected": params["original_snippet"]
                     }
                 )
-                
-            updated = original.replace(
-                params["original_snippet"],
-                params["new_snippet"],
-                1
-            )
-            final_path.write_text(updated, encoding="utf-8")
+
             return ToolCallResult(True, {"path": str(final_path)})
         except Exception as e:
             return ToolCallResult(False, None, f"修改失败: {str(e)}")
+
+    @classmethod
+    def _stream_replace(cls, final_path: Path,
+                        snippet: bytes, replacement: bytes) -> bool:
+        """对文件做单次流式替换并原子提交
+
+        按块读源文件，相邻块之间保留len(snippet)-1字节重叠防止片段
+        跨块漏配；命中后余下内容原样拷贝（保持单次替换语义）。写到
+        同目录临时文件，成功后os.replace原子换入。
+
+        :return: 是否找到并替换了片段
+        """
+        overlap = max(len(snippet) - 1, 0)
+        tmp = tempfile.NamedTemporaryFile(dir=final_path.parent, delete=False)
+        try:
+            with open(final_path, "rb") as src, tmp:
+                buffer = b""
+                replaced = False
+                while True:
+                    chunk = src.read(cls._DIFF_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if replaced:
+                        tmp.write(chunk)
+                        continue
+
+                    buffer += chunk
+                    idx = buffer.find(snippet)
+                    if idx >= 0:
+                        tmp.write(buffer[:idx])
+                        tmp.write(replacement)
+                        tmp.write(buffer[idx + len(snippet):])
+                        buffer = b""
+                        replaced = True
+                    elif len(buffer) > overlap:
+                        # 只保留可能与下一块拼出片段的尾部
+                        if overlap:
+                            tmp.write(buffer[:-overlap])
+                            buffer = buffer[-overlap:]
+                        else:
+                            tmp.write(buffer)
+                            buffer = b""
+
+                if not replaced:
+                    if not snippet:
+                        # 空片段等价于插入文件开头（对空文件也成立），
+                        # 与str.replace('', new, 1)的语义一致
+                        tmp.write(replacement)
+                        tmp.write(buffer)
+                        replaced = True
+                    else:
+                        tmp.write(buffer)
+
+            if not replaced:
+                os.unlink(tmp.name)
+                return False
+
+            shutil.copymode(final_path, tmp.name)
+            os.replace(tmp.name, final_path)
+            return True
+        except BaseException:
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+            raise
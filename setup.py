@@ -7,10 +7,12 @@ setup(
     install_requires=[
         "requests",
         # 条件依赖，Gemini分析器需要
-        "google-generativeai;python_version>='3.8'",
+        "google-generativeai;python_version>='3.10'",
     ],
     extras_require={
         "gemini": ["google-generativeai>=0.7.0"],
+        # 性能相关的可选依赖，缺失时自动回退到纯Python实现
+        "perf": ["pyahocorasick>=2.0.0", "orjson>=3.8", "aiohttp>=3.8", "aiolimiter>=1.0", "aiofiles>=23.0"],
     },
     author="Wang Bo",
     description="Tools for AI agent integration",
@@ -18,13 +20,11 @@ setup(
     long_description_content_type="text/markdown",
     classifiers=[
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.8",
-        "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: 3.11",
         "Programming Language :: Python :: 3.12",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.8",
+    python_requires=">=3.10",
 )
\ No newline at end of file